@@ -14,7 +14,8 @@ Features:
 - Allows users to select a COM port, baud rate, and number of samples per channel.
 - Displays real-time data from the serial port in a graph.
 - Allows users to freeze/unfreeze the data display.
-- Provides options to save the data as CSV, Excel, or JSON files.
+- Provides options to save the data as CSV, Excel, Parquet, or JSON files.
+- Optionally streams every received sample to a Parquet file, for recordings longer than the display buffer.
 
 Author: Martin Siemienski Andersen, Aalborg University, Aalborg, Denmark
 Copyright (c) 2024 A Curious Clincal Programmer
@@ -34,20 +35,27 @@ try:
         QComboBox,
         QPushButton,
         QSpinBox,
+        QCheckBox,
         QFileDialog,
         QTextEdit,
     )
-    from PySide6.QtCore import QTimer, Qt
+    from PySide6.QtCore import QTimer, Qt, QThreadPool, QRunnable, QObject, Signal, Slot
     from PySide6.QtGui import QKeyEvent, QKeySequence, QShortcut
     from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
     import matplotlib.pyplot as plt
     import serial
     import threading
+    import collections
     import time
     import pandas as pd
     from matplotlib.lines import Line2D
     import serial.tools.list_ports as list_ports
     import darkdetect
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    from psr_utils import ingest, count_columns, compile_kernels, decimate_minmax
 
 except ImportError as e:
     import sys
@@ -69,6 +77,9 @@ if darkdetect.isDark():
 else:
     plt.style.use("ggplot")
 
+# Let Agg merge line segments that fall within the same pixel, and render long paths in chunks
+plt.style.use("fast")
+
 
 def main() -> None:
     """Main function to set up the GUI and start the application."""
@@ -77,8 +88,9 @@ def main() -> None:
     main_window.setWindowTitle("Serial Data Viewer")
     main_window.resize(800, 800)
     model = Model()
+    app.aboutToQuit.connect(model.close_connection)
     view = View(master=main_window)
-    controller = Controller(model, view, update_rate_ms=100)
+    controller = Controller(model, view, port_poll_ms=1000)
     view.set_controller(controller=controller)
     main_window.setCentralWidget(view)
     main_window.setFocusPolicy(Qt.StrongFocus)  # Ensures widget captures all key events
@@ -90,47 +102,54 @@ def main() -> None:
 class Controller:
     """Controller class to manage interactions between the Model and View."""
 
-    def __init__(self, model: "Model", view: "View", update_rate_ms: int = 100) -> None:
+    def __init__(self, model: "Model", view: "View", port_poll_ms: int = 1000) -> None:
         self.model, self.view, self.is_frozen = model, view, False
-        self.waiting_for_port_selection(dt_ms=update_rate_ms)
+        self.save_reporter = SaveReporter()
 
-    def waiting_for_port_selection(self, dt_ms=100) -> None:
-        """Update available ports until a connection is made."""
-        if self.model.is_connected:
-            QTimer.singleShot(dt_ms, self.update_graph)
-            return
+        # Update available ports until a connection is made
         self.update_available_ports()
-        QTimer.singleShot(dt_ms, self.waiting_for_port_selection)
-
-    def update_available_ports(self, dt_ms=100) -> list[str]:
-        """Get the list of available COM ports and update the view."""
-        available_ports = self.model.get_available_ports()
-        QTimer.singleShot(
-            dt_ms,
-            lambda available_ports=available_ports: self.view.update_ports(
-                available_ports
-            ),
-        )
+        self.port_timer = QTimer()
+        self.port_timer.timeout.connect(self.update_available_ports)
+        self.port_timer.start(port_poll_ms)
+
+    def update_available_ports(self) -> None:
+        """Get the list of available COM ports and update the view, unless the window is minimized."""
+        if self.view.window().isMinimized():
+            return
+        self.view.update_ports(self.model.get_available_ports())
 
     def open_connection(
-        self, port: str, baudrate: int, samples_per_channel: int
+        self,
+        port: str,
+        baudrate: int,
+        samples_per_channel: int,
+        record_path: str | None = None,
     ) -> None:
         """Open a serial connection and update the UI elements."""
-        self.model.open_connection(port, baudrate, samples_per_channel)
+        self.model.open_connection(
+            port, baudrate, samples_per_channel, record_path=record_path
+        )
+        self.port_timer.stop()
         self.SAMPLES_PER_CHANNEL = samples_per_channel
         self.view.update_ui_elements()
+        self.update_graph()
 
     def update_graph(self, dt_ms=1000 * 1 / 50) -> None:
         """Create a thread to periodically update data if new data is available."""
+        last_state = None
 
         def graph_updating_thread():
+            nonlocal last_state
             if self.model.is_disconnected:
                 return
 
-            if self.view.isVisible():
-                df = self.model.get_snapshot(is_frozen=self.is_frozen)
-                if df is not None and not df.empty:
-                    self.view.display_data(df)
+            # Only redraw when new samples arrived, or the display was frozen or unfrozen
+            state = "frozen" if self.is_frozen else self.model.sample_count
+            if self.view.isVisible() and state != last_state:
+                plot_data = self.model.get_plot_data(is_frozen=self.is_frozen)
+                if plot_data is not None:
+                    self.view.display_data(*plot_data)
+                    last_state = state
 
             QTimer.singleShot(dt_ms, graph_updating_thread)
 
@@ -156,7 +175,7 @@ class Controller:
             logging.error("Nothing to save, unfreezing.")
             logging.warning("Attempted to save an empty snapshot.")
             return
-        QTimer.singleShot(1, lambda: open_filesave_dialog(df))
+        QTimer.singleShot(1, lambda: open_filesave_dialog(df, self.save_reporter))
 
     @property
     def is_running(self):
@@ -168,6 +187,7 @@ class View(QWidget):
     """View class to manage the graphical user interface."""
 
     lines: list[Line2D] = []
+    MAX_CHANNELS: int = 16
 
     def __init__(self, master: QMainWindow) -> None:
         super().__init__(master)
@@ -213,6 +233,7 @@ class View(QWidget):
         selection_layout.addWidget(lbl)
 
         self.port = QComboBox()
+        self.last_ports: tuple[str, ...] = ()
         selection_layout.addWidget(self.port)
 
         lbl = QLabel("Select Baudrate:")
@@ -233,50 +254,107 @@ class View(QWidget):
         self.samples_per_channel.setValue(2000)
         selection_layout.addWidget(self.samples_per_channel)
 
+        self.record_to_disk = QCheckBox("Record everything to a Parquet file")
+        selection_layout.addWidget(self.record_to_disk)
+
         self.connect_button = QPushButton("Connect")
         self.connect_button.clicked.connect(self.on_connect)
         selection_layout.addWidget(self.connect_button)
 
-        # Set Matplotlib theme based on the OS theme
-        #
-
         self.fig, self.ax = plt.subplots()
         self.ax.set_title("Real-time ADC Data")
         self.ax.set_xlabel("Samples")
         self.ax.set_ylabel("ADC Output")
         self.ax.grid(True)
+        # The limits are only ever set by update_limits()
+        self.ax.set_autoscale_on(False)
+
+        # One hidden line per possible channel, shown once data for that channel arrives
+        COLORS = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+        self.lines = []
+        for idx in range(self.MAX_CHANNELS):
+            line = Line2D(
+                xdata=[],
+                ydata=[],
+                label=f"Ch{idx}",
+                color=COLORS[idx % len(COLORS)],
+                animated=True,
+                visible=False,
+            )
+            self.lines.append(line)
+            self.ax.add_line(line)
+        self.num_visible_lines = 0
+
         self.canvas = FigureCanvas(self.fig)
         self.layout().addWidget(self.canvas)
 
+        # Background of the axes without the (animated) lines, used for blitting
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
         # logging area
         self.setup_logger()
 
-    def display_data(self, data: pd.DataFrame):
-        """Update the graph with new data."""
-        COLORS = plt.rcParams["axes.prop_cycle"].by_key()["color"]
-        if len(self.lines) != len(data.columns):
-            for line in self.lines:
-                line.remove()
-            self.lines.clear()
-            for idx, name in enumerate(data.columns):
-                line = Line2D(
-                    xdata=data.index,
-                    ydata=data[name],
-                    label=name,
-                    color=COLORS[idx % len(COLORS)],
+    def display_data(
+        self, x: np.ndarray, y: np.ndarray, names: list[str], first_sample: int = 0
+    ):
+        """Update the graph with new data, given as x values and one column of y values per channel.
+
+        `first_sample` is the sample number of the first row, used to keep the decimation steady while scrolling.
+        """
+        full_redraw = self.background is None
+        num_channels = min(len(names), self.MAX_CHANNELS)
+        if num_channels != self.num_visible_lines:
+            if len(names) > self.MAX_CHANNELS:
+                logging.warning(
+                    f"Only the first {self.MAX_CHANNELS} of {len(names)} channels are plotted, all are saved."
                 )
-                self.lines.append(line)
-                self.ax.add_line(line)
+            for idx, line in enumerate(self.lines):
+                line.set_visible(idx < num_channels)
+                if idx < num_channels:
+                    line.set_label(names[idx])
+            self.ax.legend(handles=self.lines[:num_channels], loc="upper left")
+            self.num_visible_lines = num_channels
+            full_redraw = True
+        # There is no point in drawing more than a min and max point per pixel column
+        xs, ys = decimate_minmax(x, y, 2 * int(self.ax.bbox.width), first_sample)
+        for idx in range(num_channels):
+            self.lines[idx].set_data(xs, ys[:, idx])
+        if self.update_limits(x, ys) or full_redraw:
+            # Axes changed, re-render everything once the event loop is idle. Until on_draw() has refreshed
+            # the background, further frames only re-request the (coalesced) redraw.
+            self.background = None
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_lines()
+        self.canvas.blit(self.ax.bbox)
+
+    def update_limits(self, x: np.ndarray, y: np.ndarray) -> bool:
+        """Rescale the axes if the data left them or fills less than half of them. Returns True if rescaled."""
+        ymin, ymax = float(y.min()), float(y.max())
+        pad = max(1.0, 0.05 * (ymax - ymin))
+        xlim, (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        if (
+            xlim == (x[0], x[-1])
+            and y0 <= ymin
+            and ymax <= y1
+            and y1 - y0 <= 2 * (ymax - ymin + 2 * pad)
+        ):
+            return False
+        self.ax.set_xlim(x[0], x[-1])
+        self.ax.set_ylim(ymin - pad, ymax + pad)
+        return True
 
-            if not self.ax.get_legend():
-                self.ax.legend(loc="upper left")
-        else:
-            for name, line in zip(data.columns, self.lines):
-                line.set_data(data.index.to_list(), data[name])
-        self.ax.relim()
-        self.ax.autoscale_view()
-        self.canvas.draw()
-        1
+    def on_draw(self, event):
+        """Cache the freshly rendered background and draw the lines on top of it."""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        """Draw the animated lines onto the canvas renderer."""
+        for line in self.lines[: self.num_visible_lines]:
+            self.ax.draw_artist(line)
 
     def on_connect(self):
         """Connect to the selected COM port and baudrate."""
@@ -290,21 +368,33 @@ class View(QWidget):
                 raise ValueError("Please select a COM port.")
             if baudrate <= 0:
                 raise ValueError("Please select a valid baudrate.")
+            record_path = None
+            if self.record_to_disk.isChecked():
+                record_path, _ = QFileDialog.getSaveFileName(
+                    self, "Record to", "", "Parquet files (*.parquet)"
+                )
+                if not record_path:
+                    raise ValueError("Please select a file to record to.")
             self.controller.open_connection(
-                port=port, baudrate=baudrate, samples_per_channel=samples_per_channel
+                port=port,
+                baudrate=baudrate,
+                samples_per_channel=samples_per_channel,
+                record_path=record_path,
             )
             logging.info(
                 f"Connected to port {port} with baudrate {baudrate} and {samples_per_channel} samples per channel."
             )
+            if record_path:
+                logging.info(f"Recording all samples to {record_path}")
         except Exception as e:
             logging.error(str(e))
 
     def update_ports(self, available_ports):
         """Update the available ports dropdown."""
-        if set(available_ports) == set(
-            self.port.itemText(i) for i in range(self.port.count())
-        ):
+        ports = tuple(available_ports)  # already sorted by the Model
+        if ports == self.last_ports:
             return
+        self.last_ports = ports
         selected_port = self.port.currentText()
         self.port.clear()
         self.port.addItems(available_ports)
@@ -332,6 +422,7 @@ class View(QWidget):
         self.baudrate.setEnabled(False)
         self.connect_button.setEnabled(False)
         self.samples_per_channel.setEnabled(False)
+        self.record_to_disk.setEnabled(False)
 
     def setup_logger(self):
         """Set up the logging system to write to the QTextEdit widget."""
@@ -341,15 +432,24 @@ class View(QWidget):
 
         # Create a custom logging handler
         class TextHandler(logging.Handler):
-            def __init__(self, widget: QTextEdit):
+            def __init__(self, widget: QTextEdit, flush_ms: int = 100):
                 super().__init__()
                 self.widget = widget
+                # Records are queued (from any thread) and written to the widget in batches by a GUI timer
+                self.queue: collections.deque[str] = collections.deque()
+                self.timer = QTimer(widget)
+                self.timer.timeout.connect(self.flush_to_widget)
+                self.timer.start(flush_ms)
 
             def emit(self, record):
-                if not self.widget.parent().isVisible():
+                self.queue.append(self.format(record))
+
+            def flush_to_widget(self):
+                """Append all queued log entries to the widget at once."""
+                if not self.queue or not self.widget.parent().isVisible():
                     return
-                log_entry = self.format(record)
-                self.widget.append(log_entry)
+                log_entries = [self.queue.popleft() for _ in range(len(self.queue))]
+                self.widget.append("\n".join(log_entries))
                 self.widget.verticalScrollBar().setValue(
                     self.widget.verticalScrollBar().maximum()
                 )
@@ -370,209 +470,457 @@ class Model:
     """Model class to handle data and serial communication."""
 
     __snapshot = pd.DataFrame()
-    __buffer = pd.DataFrame()
-    __df_update_lock = threading.Lock()
+    __ring: np.ndarray | None = None
+    __columns: list[str] = []
+    __head: int = 0
+    __max_value: int = 0  # largest sample value the ring buffer can hold
+    __count: int = 0
+    __seq: int = 0  # seqlock sequence number of the ring buffer, odd while writing
+    __connected: bool = False  # True while the reader thread owns the open port
+    # True while the received rows do not match the channel count
+    __skipping_rows: bool = False
+    __ports: list[str] = []
+    __ports_scan_time: float = float("-inf")
     serial_connection: serial.Serial | None = None
     read_thread: threading.Thread | None = None
     SAMPLES_PER_CHANNEL: int = 0
+    SAMPLE_DTYPE: type[np.integer] = np.int16  # the ESP32 ADC delivers 12 bit samples
+    PORTS_CACHE_SEC: float = 2.0
+    MAX_BYTES_PER_READ: int = 65536
+    RX_BUFFER_SIZE: int = 262144  # about 2.8 s of data at 921600 baud (8N1, 92 KB/s)
+    x_values: np.ndarray | None = None
+    record_path: str | None = None
+    recorder: "ParquetRecorder | None" = None
 
     def open_connection(
-        self, port: str, baudrate: int, samples_per_channel: int
+        self,
+        port: str,
+        baudrate: int,
+        samples_per_channel: int,
+        sample_dtype: type[np.integer] | None = None,
+        record_path: str | None = None,
     ) -> None:
-        """Open a serial connection and start reading in a separate thread."""
+        """Open a serial connection and start reading in a separate thread.
+
+        `sample_dtype` is the integer type the samples are stored as, which must hold the largest value sent,
+        SAMPLE_DTYPE if not given.
+        If `record_path` is given, every sample is also streamed to that Parquet file.
+        """
         if self.is_connected:
             raise serial.SerialException("Already connected to a serial port.")
+        if sample_dtype is None:
+            sample_dtype = self.SAMPLE_DTYPE
+        # Compile before the port is opened, or the reader thread would stall while data piles up in the driver
+        compile_kernels(sample_dtype)
         try:
             self.serial_connection = serial.Serial(port, baudrate)
+        except serial.SerialException as _:
+            raise serial.SerialException("Could not open serial connection")
+        try:
+            if hasattr(self.serial_connection, "set_buffer_size"):
+                # Only available on Windows, where the default driver buffer overflows quickly at high baudrates
+                self.serial_connection.set_buffer_size(rx_size=self.RX_BUFFER_SIZE)
+            if hasattr(self.serial_connection, "set_low_latency_mode"):
+                # Defined on all POSIX systems, but only implemented on Linux, where USB serial adapters otherwise
+                # deliver data in up to 16 ms batches
+                try:
+                    self.serial_connection.set_low_latency_mode(True)
+                except (ValueError, NotImplementedError) as e:
+                    logging.debug(f"Low latency mode not available: {e}")
+            if self.read_thread is not None:
+                # A previous reader may still be closing its port and recording
+                self.read_thread.join()
             self.SAMPLES_PER_CHANNEL = samples_per_channel
+            self.SAMPLE_DTYPE = sample_dtype
+            self.record_path = record_path
+            self.x_values = np.arange(-samples_per_channel, 0)
+            # Start from an empty buffer, (re)allocated and (re)recording once the first rows arrive
+            self.__ring, self.__columns, self.__max_value = None, [], 0
+            self.__head, self.__count, self.__skipping_rows = 0, 0, False
+            self.recorder = None
             self.read_thread = threading.Thread(
                 target=self.start_continuous_read_from_serial,
                 name="SerialReader",
                 daemon=True,
             )
+            self.__connected = True
             self.read_thread.start()
-        except serial.SerialException as _:
-            raise serial.SerialException("Could not open serial connection")
+        except Exception as e:
+            # Do not leave the port open, and busy for the next attempt, if setting it up failed
+            self.__connected = False
+            self.serial_connection.close()
+            raise serial.SerialException(f"Could not set up serial connection: {e}")
 
     def start_continuous_read_from_serial(
         self, updaterate_sec: float = 1.0 / 50.0, failure_duration: float = 3.0
     ):
-        """Continuously read data from the serial port in a background thread."""
-        rest, counter = "", 0
-        if self.is_connected:
-            self.serial_connection.flush()
-            self.serial_connection.read()
+        """Continuously read data from the serial port in a background thread.
 
+        The thread owns the serial port and closes it on exit, so the port is never closed under a pending read.
+        """
+        rest = b""
         t0 = time.time()
         ok = True
-        while self.is_connected:
-            try:
-                available_bytes = self.get_available_bytes()
-
-            except serial.SerialException as _:
-                self.close_connection()
-                logging.error(
-                    "ESP32 disconnected! Restart the program, if you wish to continue!"
-                )
-                return
+        try:
+            # Reads block for at most one update interval when no data is waiting
+            self.serial_connection.timeout = updaterate_sec
+            # Let the driver fill with whatever was queued before opening, then drop it along with the
+            # partial row that follows, so the first read is fresh data instead of a stale burst
+            time.sleep(0.05)
+            self.serial_connection.reset_input_buffer()
+            self.serial_connection.read_until(b"\n")
+
+            while self.__connected:
+                try:
+                    new_data = self.read_serial_data()
+
+                except serial.SerialException as _:
+                    logging.error(
+                        "ESP32 disconnected! Restart the program, if you wish to continue!"
+                    )
+                    return
 
-            if not available_bytes:
-                if ok:
-                    t0 = time.time()
+                if not new_data:
+                    if ok:
+                        t0 = time.time()
 
-                if time.time() - t0 > failure_duration:
-                    self.close_connection()
-                    return
+                    if time.time() - t0 > failure_duration:
+                        return
 
-                ok = False
-                time.sleep(updaterate_sec)
-                continue
-            ok = True
-            ascii_data = self.read_serial_data(available_bytes, rest)
-            if ascii_data is None:
-                rest = ""
-            else:
-                rest, data_integers = process_serial_data(ascii_data)
-                if data_integers:
-                    self.update_dataframe(data_integers, counter)
-                    counter += len(data_integers)
-            time.sleep(updaterate_sec)
+                    ok = False
+                    continue
+                ok = True
+                rest = self.ingest_serial_data(rest + new_data)
+        finally:
+            self.__connected = False
+            self.serial_connection.close()
+            if self.recorder is not None:
+                try:
+                    self.recorder.close()
+                    logging.info(f"Recording saved to {self.record_path}")
+                except (OSError, pa.ArrowException) as e:
+                    logging.error(f"Could not finish the recording: {e}")
+                self.recorder = None
 
     def get_available_bytes(self) -> int:
         """Get the number of available bytes in the serial connection."""
         return self.serial_connection.in_waiting
 
-    def read_serial_data(self, available_bytes: int, rest: str) -> str | None:
-        """Read data from the serial connection and decode it."""
-        try:
-            bytes = self.serial_connection.read(available_bytes)
-            return rest + bytes.decode()
-        except UnicodeDecodeError:
-            logging.warning("Read unknown non-character bytes.")
+    def read_serial_data(self) -> bytes:
+        """Read all waiting bytes (up to MAX_BYTES_PER_READ), or block until the first byte arrives or the read times out."""
+        size = min(max(self.get_available_bytes(), 1), self.MAX_BYTES_PER_READ)
+        return self.serial_connection.read(size)
+
+    def ingest_serial_data(self, raw_data: bytes) -> bytes:
+        """Parse the complete rows of the raw serial data into the ring buffer, returning the unprocessed rest.
+
+        The ring holds two copies of the N samples (rows i and i + N are equal), so the newest N samples are
+        always the contiguous rows `head:head + N`, oldest first.
+        """
+        buf = np.frombuffer(raw_data, dtype=np.uint8)
+        if self.__ring is None:
+            num_channels = count_columns(buf)
+            if num_channels == 0:
+                # Keep only the last (partial) line, so that data without valid rows (e.g. at the wrong baudrate)
+                # does not pile up. Its leading newline is kept, as count_columns skips the first line.
+                newline = max(raw_data.rfind(b"\n"), 0)
+                return raw_data[newline:][-self.MAX_BYTES_PER_READ :]
+            # Column-major, so that each channel of a ring view is contiguous for plotting and DataFrames
+            self.__ring = np.zeros(
+                (2 * self.SAMPLES_PER_CHANNEL, num_channels),
+                dtype=self.SAMPLE_DTYPE,
+                order="F",
+            )
+            self.__columns = [f"Ch{i}" for i in range(num_channels)]
+            # Values above this do not fit the ring (nor the parser's int64 accumulator) and are rejected
+            self.__max_value = int(
+                min(np.iinfo(self.SAMPLE_DTYPE).max, np.iinfo(np.int64).max)
+            )
+            if self.record_path:
+                try:
+                    self.recorder = ParquetRecorder(
+                        self.record_path, self.__columns, self.SAMPLE_DTYPE
+                    )
+                except (OSError, pa.ArrowException) as e:
+                    self.stop_recording(e)
+        # Ingest at most N rows at a time, so that the recorder sees every row before it is overwritten
+        N, start, total_rows = self.SAMPLES_PER_CHANNEL, 0, 0
+        while True:
+            # Seqlock write: the sequence number is odd while the ring is being modified
+            self.__seq += 1
+            self.__head, num_rows, consumed = ingest(
+                buf[start:],
+                self.__ring,
+                self.__head,
+                self.__ring.shape[1],
+                N,
+                self.__max_value,
+            )
+            self.__count += num_rows
+            self.__seq += 1
+            start += consumed
+            total_rows += num_rows
+            if self.recorder is not None and num_rows:
+                try:
+                    self.recorder.write(
+                        self.__ring[self.__head + N - num_rows : self.__head + N]
+                    )
+                except (OSError, pa.ArrowException) as e:
+                    self.stop_recording(e)
+            if num_rows < N:
+                break
+        if start and not total_rows:
+            # Complete lines, but none that fit the ring (e.g. the number of channels changed), warn once
+            if not self.__skipping_rows:
+                logging.warning(
+                    f"Skipping received rows that do not hold {self.__ring.shape[1]} values."
+                )
+            self.__skipping_rows = True
+        elif total_rows:
+            self.__skipping_rows = False
+        return raw_data[start:][-self.MAX_BYTES_PER_READ :]
+
+    def stop_recording(self, error: Exception) -> None:
+        """Log why the recording failed and stop it, while the live view keeps running."""
+        logging.error(f"Recording to {self.record_path} stopped: {error}")
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            try:
+                recorder.abort()
+            except (OSError, pa.ArrowException) as e:
+                logging.debug(f"Could not close the failed recording: {e}")
+
+    def __ring_view(self) -> np.ndarray | None:
+        """Return a read-only view of the newest samples in the ring buffer, oldest first."""
+        ring, head = self.__ring, self.__head
+        if ring is None:
             return None
-
-    def update_dataframe(self, data_integers: list[list[int]], counter: int) -> None:
-        """Update the DataFrame with new data."""
-        num_rows, num_channels = calculate_2D_matrix(data_integers)
-        if num_rows == 0 or num_channels == 0:
-            return
-        column_names = [f"Ch{i}" for i in range(num_channels)]
-        dfnew = pd.DataFrame(
-            data_integers,
-            index=range(counter, counter + num_rows),
-            columns=column_names,
+        view = ring[head : head + self.SAMPLES_PER_CHANNEL]
+        view.flags.writeable = False
+        return view
+
+    def __read_ring(self) -> tuple[np.ndarray | None, int, list[str]]:
+        """Copy the ring buffer, oldest row first, without blocking the writer.
+
+        Seqlock read: retry if the writer was active during, or ran since, the start of the copy.
+        Returns the copy (None before the first data), the total number of samples written and the channel names.
+        """
+        while True:
+            seq = self.__seq
+            if not seq & 1:
+                view, count, columns = self.__ring_view(), self.__count, self.__columns
+                data = None if view is None else view.copy(order="F")
+                if seq == self.__seq:
+                    return data, count, columns
+            time.sleep(0)  # let the writer finish
+
+    def __ring_to_dataframe(self) -> pd.DataFrame:
+        """Copy the ring buffer, oldest row first, into a DataFrame."""
+        data, count, columns = self.__read_ring()
+        if data is None:
+            return pd.DataFrame()
+        return pd.DataFrame(
+            data, index=range(count - len(data), count), columns=columns
         )
-        self.update_df(data=dfnew)
-
-    def update_df(self, data: pd.DataFrame) -> None:
-        """Update the buffer with new data."""
-        with self.__df_update_lock:
-            if self.__buffer.shape[1] != data.shape[1]:
-                self.__buffer = pd.DataFrame(
-                    [[0] * data.shape[1]] * self.SAMPLES_PER_CHANNEL,
-                    columns=data.columns,
-                    index=range(-self.SAMPLES_PER_CHANNEL, 0),
-                    dtype=int,
-                )
-            self.__buffer = pd.concat([self.__buffer, data], ignore_index=False)
-            if len(self.__buffer) > self.SAMPLES_PER_CHANNEL:
-                self.__buffer = self.__buffer.iloc[-self.SAMPLES_PER_CHANNEL :]
 
-    def close_connection(self) -> None:
-        """Close the serial connection."""
-        if self.is_connected:
-            self.serial_connection.close()
+    def close_connection(self, timeout: float = 2.0) -> None:
+        """Close the serial connection, waiting for the reader thread to close the port (and any recording)."""
+        self.__connected = False
+        if self.read_thread is not None:
+            self.read_thread.join(timeout)
 
     def get_available_ports(self) -> list[str]:
-        """Get the list of available COM ports."""
-        return sorted([port.device for port in list_ports.comports()])
+        """Get the list of available COM ports, rescanning at most every PORTS_CACHE_SEC seconds."""
+        now = time.monotonic()
+        if now - self.__ports_scan_time >= self.PORTS_CACHE_SEC:
+            self.__ports = sorted([port.device for port in list_ports.comports()])
+            self.__ports_scan_time = now
+        return self.__ports
 
     def update_snapshot(self) -> None:
         """Copy the current buffer into a snapshot."""
-        with self.__df_update_lock:
-            self.__snapshot = self.__buffer.copy()
+        self.__snapshot = self.__ring_to_dataframe()
 
     def get_snapshot(self, is_frozen: bool) -> pd.DataFrame:
-        """Return a snapshot of the data or the buffer."""
-        if self.is_disconnected:
-            return self.__snapshot.copy()
-        with self.__df_update_lock:
-            return self.__snapshot.copy() if is_frozen else self.__buffer.copy()
+        """Return a snapshot of the data or the buffer.
+
+        The stored snapshot is only ever replaced, never modified, so it is returned without copying.
+        """
+        if self.is_disconnected or is_frozen:
+            return self.__snapshot
+        return self.__ring_to_dataframe()
+
+    def get_plot_data(
+        self, is_frozen: bool
+    ) -> tuple[np.ndarray, np.ndarray, list[str], int] | None:
+        """Return the x values, the y values (one column per channel), the channel names and the first sample number."""
+        if is_frozen or self.is_disconnected:
+            if self.__snapshot.empty:
+                return None
+            return (
+                self.x_values,
+                self.__snapshot.to_numpy(),
+                list(self.__snapshot.columns),
+                self.__snapshot.index[0],
+            )
+        return self.get_live_view()
+
+    def get_live_view(
+        self,
+    ) -> tuple[np.ndarray, np.ndarray, list[str], int] | None:
+        """Return the x values, a zero-copy read-only view of the ring buffer, the channel names and the first sample number.
+
+        The reader thread keeps writing into the viewed memory, so use the view right away (e.g. for one frame).
+        """
+        count, y = self.__count, self.__ring_view()
+        if y is None:
+            return None
+        return self.x_values, y, self.__columns, count - self.SAMPLES_PER_CHANNEL
+
+    @property
+    def sample_count(self) -> int:
+        """Total number of samples received since the connection was opened."""
+        return self.__count
 
     @property
     def is_connected(self) -> bool:
         """Check if the serial connection is established."""
-        b = (
-            self.serial_connection
-            and self.serial_connection.is_open
-            and self.read_thread.is_alive()
-        )
-        return b
+        return self.__connected
 
     @property
     def is_disconnected(self) -> bool:
         """Check if the serial connection is not established."""
         return not self.is_connected
 
-    def __del__(self) -> None:
-        """Destructor to close the serial connection."""
-        self.close_connection()
 
+class ParquetRecorder:
+    """Stream samples to a Parquet file in row groups, so that a recording does not have to fit in memory."""
 
-def process_serial_data(ascii_data: str) -> tuple[str, list[list[int]]]:
-    """Process the ASCII data read from the serial connection."""
-    row_asci_data = ascii_data.split("\r\n")
-    if len(row_asci_data) < 3:
-        # Requires at least 3 ready samples, to process. otherwise return all samples as rest
-        return ascii_data, []
+    ROWS_PER_GROUP: int = 65536
+
+    def __init__(self, file_path: str, columns: list[str], dtype: type) -> None:
+        self.columns = ["Sample", *columns]
+        schema = pa.schema(
+            [("Sample", pa.int64())]
+            + [(name, pa.from_numpy_dtype(dtype)) for name in columns]
+        )
+        self.writer = pq.ParquetWriter(file_path, schema, compression="zstd")
+        self.pending: list[np.ndarray] = []
+        self.num_pending = 0
+        self.num_written = 0
+
+    def write(self, rows: np.ndarray) -> None:
+        """Queue a copy of the rows, writing a row group once enough rows are queued."""
+        self.pending.append(rows.copy())
+        self.num_pending += len(rows)
+        if self.num_pending >= self.ROWS_PER_GROUP:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the queued rows to the file."""
+        if not self.pending:
+            return
+        data = np.concatenate(self.pending)
+        samples = np.arange(self.num_written, self.num_written + len(data))
+        arrays = [pa.array(samples)]
+        arrays += [pa.array(data[:, idx]) for idx in range(data.shape[1])]
+        self.writer.write_table(pa.Table.from_arrays(arrays, names=self.columns))
+        self.num_written += len(data)
+        self.pending, self.num_pending = [], 0
+
+    def close(self) -> None:
+        """Write the remaining rows and finish the file."""
+        self.flush()
+        self.writer.close()
+
+    def abort(self) -> None:
+        """Drop the queued rows and finish the file, keeping the row groups written so far readable."""
+        self.pending, self.num_pending = [], 0
+        self.writer.close()
 
-    rest = row_asci_data[-1]  # Last row is rest
-    data = row_asci_data[:-2]
-    data_filtered = filter(str_contains_only_numbers, data)
-    data_integers = list(map(str_to_intarray, data_filtered))
-    return rest, data_integers
 
+class SaveReporter(QObject):
+    """Relay log messages from save workers to the GUI thread, where the log widget lives."""
 
-def str_contains_only_numbers(row: str) -> bool:
-    """Check if a string contains only numbers and spaces."""
-    return row and all(c.isdigit() or c == " " for c in row)
+    message = Signal(int, str)
 
+    def __init__(self) -> None:
+        super().__init__()
+        self.message.connect(self.log)
 
-def str_to_intarray(data: str) -> list[int]:
-    """Convert a string of numbers separated by spaces to a list of integers."""
-    return list(map(int, data.split(" ")))
+    @Slot(int, str)
+    def log(self, level: int, msg: str) -> None:
+        """Log a message from a save worker."""
+        logging.log(level, msg)
 
 
-def calculate_2D_matrix(data: list[list[int]]) -> tuple[int, int]:
-    """Calculate the number of rows and columns in a 2D matrix."""
-    num_rows = len(data)
-    num_cols = len(data[0]) if num_rows else 0
-    return num_rows, num_cols
+class SaveTask(QRunnable):
+    """Write a DataFrame to a file in a QThreadPool worker, keeping the GUI responsive."""
+
+    def __init__(
+        self, df: pd.DataFrame, file_path: str, reporter: SaveReporter
+    ) -> None:
+        super().__init__()
+        self.df, self.file_path, self.reporter = df, file_path, reporter
+
+    def run(self) -> None:
+        """Save the data and report the outcome to the GUI thread."""
+        try:
+            msg = save_dataframe(self.df, self.file_path)
+        except Exception as e:
+            self.reporter.message.emit(
+                logging.ERROR, f"Could not save data to {self.file_path}: {e}"
+            )
+            return
+        self.reporter.message.emit(logging.INFO, msg)
 
 
-def open_filesave_dialog(df: pd.DataFrame):
-    file_dialog = QFileDialog()
-    file_path, _ = file_dialog.getSaveFileName(
+def open_filesave_dialog(df: pd.DataFrame, reporter: SaveReporter):
+    file_path, _ = QFileDialog.getSaveFileName(
         None,
         "Save Timeseries",
         "",
-        "Excel files (*.xlsx);;CSV files (*.csv);;JSON files (*.json);;All files (*.*)",
+        "Excel files (*.xlsx);;CSV files (*.csv);;Parquet files (*.parquet);;JSON files (*.json);;All files (*.*)",
     )
     if file_path == "":
         return
-    if file_path.endswith(".csv"):
-        df.to_csv(file_path, index=True)
-        msg = f"Data saved as CSV to {file_path}"
-    elif file_path.endswith(".xlsx"):
-        df.to_excel(file_path, index=True)
-        msg = f"Data saved as Excel to {file_path}"
-    elif file_path.endswith(".json"):
-        df.to_json(file_path, orient="records", lines=True)
-        msg = f"Data saved as JSON to {file_path}"
-    else:
-        logging.error("Invalid file format. Please save as CSV, Excel, or JSON.")
+    if not file_path.endswith((".csv", ".xlsx", ".parquet", ".json")):
+        logging.error(
+            "Invalid file format. Please save as CSV, Excel, Parquet, or JSON."
+        )
         return
-    logging.info(msg)
+    logging.info(f"Saving data to {file_path}...")
+    QThreadPool.globalInstance().start(SaveTask(df, file_path, reporter))
+
+
+def save_dataframe(df: pd.DataFrame, file_path: str) -> str:
+    """Write the data to a CSV, Excel, Parquet or JSON file, chosen by extension. Returns a message for the log."""
+    if file_path.endswith(".csv"):
+        # pyarrow formats the values in C, the (unquoted) header is written separately
+        with open(file_path, "wb") as f:
+            f.write(",".join(["", *map(str, df.columns)]).encode() + b"\n")
+            pacsv.write_csv(
+                dataframe_to_table(df, index_name=""),
+                f,
+                write_options=pacsv.WriteOptions(include_header=False),
+            )
+        return f"Data saved as CSV to {file_path}"
+    if file_path.endswith(".xlsx"):
+        df.to_excel(file_path, index=True, engine="xlsxwriter")
+        return f"Data saved as Excel to {file_path}"
+    if file_path.endswith(".parquet"):
+        pq.write_table(dataframe_to_table(df, index_name="Sample"), file_path)
+        return f"Data saved as Parquet to {file_path}"
+    df.to_json(file_path, orient="split")
+    return f"Data saved as JSON to {file_path}"
+
+
+def dataframe_to_table(df: pd.DataFrame, index_name: str) -> pa.Table:
+    """Convert the data to an Arrow table, with the index as the first column."""
+    names = [index_name, *map(str, df.columns)]
+    arrays = [pa.array(df.index.to_numpy())]
+    arrays += [pa.array(df[column].to_numpy()) for column in df.columns]
+    return pa.Table.from_arrays(arrays, names=names)
 
 
 if __name__ == "__main__":
@@ -1 +1,169 @@
 """Utility functions for the python serial recorder."""
+
+import numpy as np
+from numba import njit
+
+# ASCII byte values used by the parsers
+_LF, _CR, _SPACE, _ZERO = 10, 13, 32, 48
+
+# Byte-repeated masks for SWAR (SIMD within a register) validation of 8 bytes at a time
+_HIGH_BITS = np.uint64(0x8080808080808080)
+_LOW_BITS = np.uint64(0x7F7F7F7F7F7F7F7F)
+_ZEROS = np.uint64(0x3030303030303030)  # b"0" in every byte
+_SPACES = np.uint64(0x1010101010101010)  # b" " after xor with _ZEROS
+_TENS = np.uint64(0x7676767676767676)  # 0x80 - 10 in every byte
+
+# The kernels run in the serial reader thread and release the GIL, so parsing never stalls the GUI thread
+
+
+@njit(cache=True, nogil=True)
+def valid_row(buf: np.ndarray, start: int, end: int) -> bool:
+    """Check that `buf[start:end]` only holds ASCII digits and spaces, using SWAR on 8 bytes at a time."""
+    i = start
+    while i + 8 <= end:
+        word = np.uint64(0)
+        for k in range(8):
+            word |= np.uint64(buf[i + k]) << np.uint64(8 * k)
+        if word & _HIGH_BITS:
+            return False
+        x = word ^ _ZEROS  # digits become 0..9 and spaces 0x10
+        not_digit = (x + _TENS) & _HIGH_BITS
+        y = x ^ _SPACES
+        not_space = (((y & _LOW_BITS) + _LOW_BITS) | y) & _HIGH_BITS
+        if not_digit & not_space:
+            return False
+        i += 8
+    for j in range(i, end):
+        c = buf[j]
+        if c != _SPACE and not (_ZERO <= c < _ZERO + 10):
+            return False
+    return True
+
+
+@njit(cache=True, nogil=True)
+def ingest(
+    buf: np.ndarray,
+    ring: np.ndarray,
+    head: int,
+    ncols: int,
+    max_rows: int,
+    max_value: int,
+) -> tuple[int, int, int]:
+    """Parse complete rows of space separated integers from a uint8 buffer straight into a mirrored ring buffer.
+
+    The ring holds N = len(ring) // 2 samples twice (rows i and i + N), each row is written at `head` and
+    `head + N`. Rows containing anything but digits and spaces, not holding exactly `ncols` values, or holding a
+    value above `max_value` (the largest value the ring's dtype can hold), are skipped.
+    Stops after `max_rows` rows have been written.
+    Returns `(new_head, rows_written, tail_start)`, where `tail_start` is the index of the first unconsumed byte.
+    """
+    N = ring.shape[0] // 2
+    row = np.empty(ncols, dtype=ring.dtype)
+    rows, start = 0, 0
+    # Any value up to this can take another digit without exceeding max_value
+    limit = (max_value - 9) // 10
+    for i in range(buf.shape[0]):
+        if buf[i] != _LF:
+            continue
+        end = i - 1 if i > start and buf[i - 1] == _CR else i
+        if valid_row(buf, start, end):
+            col, val, in_number = 0, 0, False
+            for j in range(start, end):
+                c = buf[j]
+                if c == _SPACE:
+                    if in_number:
+                        if col < ncols:
+                            row[col] = val
+                        col += 1
+                    val, in_number = 0, False
+                else:
+                    digit = c - _ZERO
+                    # Checked before multiplying, so that long digit runs cannot overflow `val` either
+                    if val > limit and val > (max_value - digit) // 10:
+                        col, in_number = -1, False
+                        break
+                    val = val * 10 + digit
+                    in_number = True
+            if in_number:
+                if col < ncols:
+                    row[col] = val
+                col += 1
+            if col == ncols:
+                ring[head] = row
+                ring[head + N] = row
+                head = (head + 1) % N
+                rows += 1
+        start = i + 1
+        if rows == max_rows:
+            break
+    return head, rows, start
+
+
+@njit(cache=True, nogil=True)
+def count_columns(buf: np.ndarray) -> int:
+    """Return the number of values in the last complete valid row of a uint8 buffer, or 0 if there is none.
+
+    The first line is skipped, as it may be the cut-off end of a row sent before the port was opened.
+    """
+    ncols, start, skip = 0, 0, True
+    for i in range(buf.shape[0]):
+        if buf[i] != _LF:
+            continue
+        if skip:
+            start, skip = i + 1, False
+            continue
+        end = i - 1 if i > start and buf[i - 1] == _CR else i
+        if valid_row(buf, start, end):
+            col, in_number = 0, False
+            for j in range(start, end):
+                if buf[j] == _SPACE:
+                    if in_number:
+                        col += 1
+                    in_number = False
+                else:
+                    in_number = True
+            if in_number:
+                col += 1
+            if col:
+                ncols = col
+        start = i + 1
+    return ncols
+
+
+def compile_kernels(dtype: type[np.integer] = np.int16) -> None:
+    """Compile the parsing kernels for a ring buffer of `dtype` (or load them from the cache) by running them once.
+
+    Compiling takes seconds and holds the GIL, so do this before the port is opened, not in the reader thread.
+    """
+    # Same array types as in the reader: a read-only byte buffer and a column-major ring. A single channel ring
+    # is also C-contiguous, which numba types (and compiles) separately.
+    buf = np.frombuffer(b"1 2\n3 4\n", dtype=np.uint8)
+    count_columns(buf)
+    max_value = int(min(np.iinfo(dtype).max, np.iinfo(np.int64).max))
+    for ncols in (1, 2):
+        ring = np.zeros((4, ncols), dtype=dtype, order="F")
+        ingest(buf, ring, 0, ncols, 2, max_value)
+
+
+def decimate_minmax(
+    x: np.ndarray, y: np.ndarray, max_points: int, first_sample: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce `x` and the channels (columns) of `y` to about `max_points` rows, keeping the min and max of each bucket.
+
+    The bucket edges are aligned to multiples of the bucket size in absolute sample numbers (`first_sample` being
+    the number of the first row), so the buckets do not shift, and the plot does not wiggle, as new samples arrive.
+    Returns the inputs unchanged if they are already short enough.
+    """
+    size = len(x) // max(max_points // 2, 1)
+    if size < 2:
+        return x, y
+    edges = np.arange(-first_sample % size, len(x), size)
+    if edges[0] != 0:
+        edges = np.concatenate(([0], edges))  # partial bucket of the oldest samples
+    x_out = np.empty(2 * len(edges), dtype=x.dtype)
+    x_out[0::2], x_out[1::2] = x[edges], x[np.append(edges[1:], len(x)) - 1]
+    y_out = np.empty((2 * len(edges), y.shape[1]), dtype=y.dtype)
+    for col in range(y.shape[1]):
+        y_out[0::2, col] = np.minimum.reduceat(y[:, col], edges)
+        y_out[1::2, col] = np.maximum.reduceat(y[:, col], edges)
+    return x_out, y_out